@@ -1,10 +1,14 @@
 import os
 import pandas as pd
 
-def get_qc_df(qc_file):
+def get_qc_df(qc_file, prev_qc_df=None):
     """
     Creates a dataframe from the cumulative qc file (qc_data/cumul_qc.txt).
     If no qc file has been produced, it returns a placeholder.
+    If a previous qc df is given, the formatted timestamps of batches
+    already in it are reused, so only new batches need their timestamps
+    parsed. The qc file is rewritten by the pipeline, not appended to,
+    so the whole file is read every time.
     """
     # checks if the data has been created
     if os.path.isfile(qc_file): 
@@ -20,6 +24,17 @@ def get_qc_df(qc_file):
     qc_df['Cumulative reads'] = qc_df['Reads'].cumsum() 
     # create cumulative bp
     qc_df['Cumulative bp'] = qc_df['Bp'].cumsum() 
+    # batch timestamps formatted once for the barplot x axis
+    if prev_qc_df is None:
+        qc_df['TimeStr'] = pd.to_datetime(qc_df['Time']).dt.strftime('%H:%M:%S')
+    else:
+        # timestamps that have already been formatted
+        known_times = dict(zip(prev_qc_df['Time'], prev_qc_df['TimeStr']))
+        time_str = qc_df['Time'].map(known_times)
+        # format only the batches that are new
+        new_batches = time_str.isna()
+        if new_batches.any():
+            time_str[new_batches] = pd.to_datetime(qc_df.loc[new_batches, 'Time']).dt.strftime('%H:%M:%S')
+        qc_df['TimeStr'] = time_str
     
     return qc_df
-
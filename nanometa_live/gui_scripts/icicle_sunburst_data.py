@@ -4,27 +4,30 @@ from nanometa_live.gui_scripts.get_icicle_data import get_icicle_data
 import yaml
 import os
 
-def icicle_sunburst_data(raw_df, domains, count = 10, config_file_path='config.yaml'):
+def icicle_sunburst_data(raw_df, domains, count = 10, config_file_path='config.yaml', config_letters=None):
     """
     Creates the data in the format needed for plotly sunsickle charts.
     Data format for sunburst and icicle is identical.
+    The tax letters can be passed directly as config_letters, otherwise
+    they are read from the config file.
     """
     
-    # Check if the config file exists
-    if not os.path.exists(config_file_path):
-        print(f"Error: Config file '{config_file_path}' not found.")
-        return None
+    if config_letters is None:
+        # Check if the config file exists
+        if not os.path.exists(config_file_path):
+            print(f"Error: Config file '{config_file_path}' not found.")
+            return None
 
-    # Load config file variables
-    try:
-        with open(config_file_path, 'r') as cf:
-            config_contents = yaml.safe_load(cf)
-    except Exception as e:
-        print(f"Error: An issue occurred while reading the config file. Details: {e}")
-        return None
+        # Load config file variables
+        try:
+            with open(config_file_path, 'r') as cf:
+                config_contents = yaml.safe_load(cf)
+        except Exception as e:
+            print(f"Error: An issue occurred while reading the config file. Details: {e}")
+            return None
 
-    # Gets the tax letters from the config file.
-    config_letters = config_contents['taxonomic_hierarchy_letters']
+        # Gets the tax letters from the config file.
+        config_letters = config_contents['taxonomic_hierarchy_letters']
     
     # Filters by domain.
     d_filt_df = domain_filtering(raw_df, domains)
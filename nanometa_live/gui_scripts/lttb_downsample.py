@@ -0,0 +1,34 @@
+import numpy as np
+
+def lttb_downsample(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a line series.
+    Returns the indices of the points to keep, at most n_out of them.
+    The first and last points are always kept. x must be numeric and sorted.
+    """
+    n = len(y)
+    # nothing to do for short series
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # the points between the first and last are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0] = 0
+    keep[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # average point of the next bucket (the last point for the final bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # keep the point forming the largest triangle with the previous
+        # kept point and the next bucket average
+        area = np.abs((x[prev] - avg_x) * (y[start:end] - y[prev])
+                      - (x[prev] - x[start:end]) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        keep[i + 1] = prev
+    return keep
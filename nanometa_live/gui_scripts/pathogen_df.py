@@ -1,32 +1,33 @@
 import pandas as pd
-import math
+import numpy as np
 
 def pathogen_df(pathogen_list, raw_df): 
     """
     Creates a df of data on specified pathogens from config list.
+    The matching kreport rows are found with numpy on whole columns
+    and ordered as in the pathogen list.
     """
     
+    pathogen_ids = np.asarray(pathogen_list)
+    tax_ids = raw_df.iloc[:,4].to_numpy()
+    # rows of the kreport matching a pathogen taxID
+    hit_rows = np.flatnonzero(np.isin(tax_ids, pathogen_ids))
+    if hit_rows.size > 0:
+        # position of each hit in the pathogen list
+        sorter = np.argsort(pathogen_ids, kind='stable')
+        list_pos = sorter[np.searchsorted(pathogen_ids, tax_ids[hit_rows], sorter=sorter)]
+        # order the hits as in the pathogen list
+        hit_rows = hit_rows[np.argsort(list_pos, kind='stable')]
+    
+    reads = raw_df.iloc[hit_rows,2].to_numpy()
+    # log of the reads for danger meter, zero values set to 0
+    log10reads = np.zeros(len(reads))
+    np.log10(reads, out=log10reads, where=reads > 0)
+    
     # df makes layout much easier
-    pathogen_info = pd.DataFrame(columns= ['Name', 
-                                           'Tax ID',
-                                           'Reads', 
-                                           'Percent reads', 
-                                           'log10(Reads)'])
-    # iterates through the list of tax IDs
-    for entry in pathogen_list: 
-        # compares each pathogen against IDs in kreport
-        for i in range(raw_df.shape[0]): 
-            # if there is a match
-            if entry == raw_df.iloc[i,4]: 
-                # handle zero values for log function
-                if raw_df.iloc[i,2] == 0: 
-                    log10reads = 0 # set it to 0
-                else: # get the log of the reads for danger meter
-                    log10reads = math.log(raw_df.iloc[i,2],10)
-                # add the species to the results df.
-                pathogen_info.loc[len(pathogen_info.index)] = [raw_df.iloc[i,5], # add pathogen name 
-                                                               raw_df.iloc[i,4], # add pathogen taxID
-                                                               raw_df.iloc[i,2], # add pathogen nr of reads
-                                                               raw_df.iloc[i,0], # add percent reads for pathogens
-                                                               log10reads] # log value for the danger meter
+    pathogen_info = pd.DataFrame({'Name': raw_df.iloc[hit_rows,5].to_numpy(), # pathogen name 
+                                  'Tax ID': tax_ids[hit_rows], # pathogen taxID
+                                  'Reads': reads, # pathogen nr of reads
+                                  'Percent reads': raw_df.iloc[hit_rows,0].to_numpy(), # percent reads for pathogens
+                                  'log10(Reads)': log10reads}) # log value for the danger meter
     return pathogen_info
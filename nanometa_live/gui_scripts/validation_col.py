@@ -1,5 +1,19 @@
 import os
 import pandas as pd
+from functools import lru_cache
+
+@lru_cache(maxsize=256)
+def blast_unique_seqs(path, mtime):
+    """
+    Returns the nr of unique sequences in a blast result file.
+    Cached on the file modification time, so a file is only
+    parsed again when the pipeline has updated it.
+    """
+    # import data
+    val_df = pd.read_csv(path, sep='\t', header=None)
+    # extract nr of unique sequences. Many sequences will have several matches 
+    # on the genome
+    return val_df.iloc[:,0].nunique()
 
 def validation_col(validation_list, blast_dir, read_nr_list):
     """
@@ -26,13 +40,8 @@ def validation_col(validation_list, blast_dir, read_nr_list):
         #print(path)
         if os.path.isfile(path): # if file exists
             #print('path exists')
-            # import data
-            val_df = pd.read_csv(path, sep='\t', header=None)
-            #print(val_df)
-            #print(val_df.iloc[:,0])
-            # extract nr of unique sequences. Many sequences will have several matches 
-            # on the genome
-            unique_seqs = val_df.iloc[:,0].nunique()
+            # get the nr of unique sequences, cached per file version
+            unique_seqs = blast_unique_seqs(path, os.path.getmtime(path))
             #print(unique_seqs)
             #print(unique_seqs)
             # add nr to column
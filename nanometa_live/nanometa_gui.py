@@ -18,13 +18,12 @@ some smaller functions remain in the callbacks themselves.
 
 ########## DASH PACKAGES ######################################################
 import dash
-from dash import Dash, html, dcc, Output, Input, State, dash_table
+from dash import Dash, html, dcc, Output, Input, State, dash_table, Patch
 import dash_daq as daq
 import dash_bootstrap_components as dbc
 
 ########## PLOTLY PACKAGES ####################################################
 import plotly.graph_objects as go
-import plotly.express as px
 
 ########## OTHER PACKAGES #####################################################
 import numpy as np
@@ -33,7 +32,7 @@ import os
 import yaml
 import sys
 import argparse
-import subprocess
+from functools import lru_cache
 
 ########## CUSTOM SCRIPTS #####################################################
 
@@ -52,7 +51,7 @@ from nanometa_live.gui_scripts.format_sankey import format_sankey
 from nanometa_live.gui_scripts.pathogen_df import pathogen_df
 from nanometa_live.gui_scripts.domain_filtering import domain_filtering
 from nanometa_live.gui_scripts.get_qc_df import get_qc_df
-from nanometa_live.gui_scripts.fix_list_order import fix_list_order
+from nanometa_live.gui_scripts.lttb_downsample import lttb_downsample
 from nanometa_live.gui_scripts.create_top_list import create_top_list
 from nanometa_live.gui_scripts.icicle_sunburst_data import icicle_sunburst_data
 from nanometa_live.gui_scripts.validation_col import validation_col
@@ -79,7 +78,103 @@ args = parser.parse_args()
 # Some functions that are, for different reasons, not suitable to
 # be external scripts.
 
-def sankey_fig_layout():
+def file_mtime(path):
+    '''
+    Returns the modification time of a file or directory, or None if it
+    does not exist yet. Used as cache key so that data files are only
+    parsed again when changed.
+    '''
+    if os.path.exists(path):
+        return os.path.getmtime(path)
+    return None
+
+# The cached loaders below are keyed on (path, mtime): all callbacks
+# firing on the same interval share one parsed dataframe until the
+# pipeline writes a new version of the file.
+# The returned objects are shared and must not be modified by callbacks.
+
+@lru_cache(maxsize=4)
+def cached_raw_df(path, mtime):
+    '''
+    Cached version of kreport2_df.
+    '''
+    return kreport2_df(path)
+
+def raw_df_version(raw_mtime):
+    '''
+    Returns the raw_df parsed from the kreport with modification time raw_mtime.
+    The data derived from raw_df is cached on raw_mtime, so it is loaded
+    from the key and not from the global raw_df, which may have moved on.
+    Before there is a kreport (raw_mtime is None) the placeholder is used.
+    '''
+    if raw_mtime is None:
+        return placeholder_raw_df
+    return cached_raw_df(kreport_file, raw_mtime)
+
+@lru_cache(maxsize=4)
+def cached_fastp_df(path, mtime):
+    '''
+    Cached version of get_fastp_df.
+    '''
+    return get_fastp_df(path)
+
+@lru_cache(maxsize=32)
+def cached_icicle_data(raw_mtime, domains, filter_value):
+    '''
+    Cached version of icicle_sunburst_data for the raw_df version raw_mtime.
+    The domains must be passed as a tuple to be hashable.
+    '''
+    return icicle_sunburst_data(raw_df_version(raw_mtime), list(domains), filter_value, config_letters=hierarchy_letters)
+
+def load_qc_df():
+    '''
+    Returns the latest qc df. The qc file is only read again when it has
+    changed, and then only the new batches have their timestamps parsed.
+    The returned df is shared and must not be modified by callbacks.
+    '''
+    global qc_cache
+    mtime = file_mtime(qc_file)
+    cached_mtime, cached_qc_df = qc_cache
+    if mtime != cached_mtime:
+        cached_qc_df = get_qc_df(qc_file, cached_qc_df)
+        # mtime and df replaced together
+        qc_cache = (mtime, cached_qc_df)
+    return cached_qc_df
+
+@lru_cache(maxsize=32)
+def cached_sankey_data(raw_mtime, domains, clades, top_filter):
+    '''
+    Cached version of create_sankey_data for the raw_df version raw_mtime.
+    The domains and clades must be passed as tuples to be hashable.
+    '''
+    if raw_mtime is None: # if there are no data files yet
+        return placeholder_data # returns a placeholder (defined below)
+    return create_sankey_data(raw_df_version(raw_mtime), list(domains), list(clades), top_filter)
+
+@lru_cache(maxsize=4)
+def cached_pathogen_info(raw_mtime):
+    '''
+    Reads and coloring of the species of interest for the raw_df version raw_mtime.
+    Kept on the server: only raw_mtime is passed between the pathogen callbacks.
+    '''
+    pathogen_info = pathogen_df(pathogen_ids, raw_df_version(raw_mtime))
+    # Deals with species of interest not present in kreport.
+    # They are added all at once with zero reads.
+    missing_ids = pathogen_ids[~np.isin(pathogen_ids, pathogen_info['Tax ID'].to_numpy())].tolist()
+    if missing_ids:
+        # Use the species name from species_dict instead of 'not found in DB'
+        missing_df = pd.DataFrame({'Name': [species_dict[taxid] for taxid in missing_ids],
+                                   'Tax ID': missing_ids,
+                                   'Reads': 0,
+                                   'Percent reads': 0.0,
+                                   'log10(Reads)': 0}) # not needed anymore, remove later
+        pathogen_info = pd.concat([pathogen_info, missing_df], ignore_index=True)
+
+    # Adding a column for the coloring sceme.
+    pathogen_info['Color'] = np.where(pathogen_info['Reads'].to_numpy() < danger_lower_limit, 'Green', 'Red')
+    return pathogen_info[pathogen_info_cols]
+
+def sankey_fig_layout(sankey_fig):
     '''
     Defines layout for the sankey plot.
     '''
@@ -95,26 +190,13 @@ def sankey_fig_layout():
                              margin=dict(t=20, l=20, b=20, r=50)
                              )
 
-def create_sankey_data(selected_domains, clade_list, top_filter = 5):
+def create_sankey_data(kraken_df, selected_domains, clade_list, top_filter = 5):
     '''
-    Main script for sankey data processing and raw data updating.
-    (The raw data updating should ideally be made a separate function that
-    all the plots and things call, but it can't since it needs to be
-    linked to a callback to be interval triggered.)
+    Main script for sankey data processing.
+    kraken_df is a raw_df from the cumulative kreport.
     '''
-    # Updates the global variable for use in other functions.
-    # raw_df is the imported cumulative kreport file.
-    global raw_df
-    if update_disabled == False: # if True: raw_df is not updated
-        while not os.path.isfile(kreport_file): # if there are no data files yet
-            return placeholder_data # returns a placeholder (defined below)
-            break
-        # Imports the latest kreport as a df if update is on.
-        # kreport file path specified at the start of script.
-        raw_df = kreport2_df(kreport_file)
-    # Jumps directly to filtering if update is not on.
     # Keeps only the domains specified by the user checkboxes.
-    d_filt_df = domain_filtering(raw_df, selected_domains)
+    d_filt_df = domain_filtering(kraken_df, selected_domains)
 
     # Designated tax hierarchy from config file, selection by checkboxes.
     # A list and a reversed list needed for further functions.
@@ -153,23 +235,72 @@ def create_sankey_data(selected_domains, clade_list, top_filter = 5):
     sankey_data = format_sankey(top_df, label, pad=30)
     return sankey_data
 
+def create_qc_fig(trace, title, y_title, batch_axis=False):
+    '''
+    Creates a QC plot with its layout. The layout is only defined here,
+    the QC callback then patches in new trace data at each update.
+    '''
+    qc_fig = go.Figure(trace)
+    # The sizes might need to be adjusted depending on platform/screen size.
+    qc_fig.update_layout(width=650,
+                         height=350,
+                         margin=dict(l=10, r=10, t=35, b=10),
+                         title=title
+                         )
+    qc_fig.update_yaxes(title_text=y_title)
+    if batch_axis:
+        # Barcharts are discrete instead of continous.
+        qc_fig.update_xaxes(title_text="Batch timestamp", type='category')
+    else:
+        qc_fig.update_xaxes(title_text="Time")
+    return qc_fig
+
+def qc_patch(x, y):
+    '''
+    Partial update of a QC plot: only the trace data is replaced,
+    the layout is left as it was created.
+    '''
+    patch = Patch()
+    patch['data'][0]['x'] = x
+    patch['data'][0]['y'] = y
+    return patch
+
+def create_pathogen_fig():
+    '''
+    Creates the pathogen barchart with its layout.
+    The pathogen callback then patches in new bars at each update.
+    '''
+    pathogen_barchart_fig = go.Figure(go.Bar(x=[],
+                                             y=[],
+                                             marker_color=[],
+                                             width=0.4, # width of columns
+                                             hovertemplate='<b>%{x}</b><br>Number of Reads: %{y}<extra></extra>'
+                                             )
+                                      )
+    pathogen_barchart_fig.update_layout(width=700,
+                                        height=400,
+                                        title='Number of reads per species of interest',
+                                        xaxis_title='Species',
+                                        yaxis_title='Number of Reads',
+                                        showlegend=False
+                                        )
+    return pathogen_barchart_fig
+
 def create_pathogen_table():
     '''
     Creates a colored table of specified pathogens.
     Ranges for coloring specifyable in config file.
     The callback functions send the variables 'data' and 'columns' here.
     '''
-    # The lower read limit for when an entry is colored red.
-    dll = str(config_contents["danger_lower_limit"])
     # Creates the table.
     path_tabl = dash_table.DataTable(
         data = df_to_print.to_dict('records'),
-        columns = [{"name": i, "id": i} for i in df_to_print.columns],
+        columns = pathogen_columns,
         id='pathogen_table',
         fill_width=False,
         style_data_conditional=[
             {'if': {
-                'filter_query': '{Reads} >' + dll
+                'filter_query': '{Reads} >' + str(danger_lower_limit)
                 },
                 'backgroundColor': '#fc3030'} # red
             ]
@@ -183,25 +314,28 @@ def create_top_table():
     '''
     top_tabl = dash_table.DataTable(
         data = top_df.to_dict('records'),
-        columns = [{"name": i, "id": i} for i in top_df.columns],
+        columns = top_columns,
         id='top_table',
         fill_width=False)
     return top_tabl
 
-def create_sunburst(ice_sun_data):
+def create_sunburst():
     '''
-    Creates the sunburst plot fig.
+    Creates the sunburst plot fig with its layout.
+    The sunburst callback then patches in new data at each update.
     '''
-    sunburst_fig =px.sunburst(ice_sun_data,
-                              names='Taxon',
-                              parents='Parent',
-                              values='Reads',
-                              color='Reads',
-                              color_continuous_scale='Jet'
-                              )
-    sunburst_fig.update_traces(selector=dict(type='sunburst'),
-                               hovertemplate='<b>%{label} </b> <br> Reads: %{value}' # define hover data
-                               )
+    sunburst_fig = go.Figure(go.Sunburst(labels=[],
+                                         parents=[],
+                                         values=[],
+                                         # colored by reads
+                                         marker=dict(colors=[],
+                                                     colorscale='Jet',
+                                                     showscale=True,
+                                                     colorbar=dict(title='Reads')
+                                                     ),
+                                         hovertemplate='<b>%{label} </b> <br> Reads: %{value}<extra></extra>' # define hover data
+                                         )
+                             )
     sunburst_fig.update_layout({'autosize': False},# autolayout off!
                                height = 900,
                                width=900,
@@ -235,9 +369,22 @@ except Exception as e:
 
 # Create interval frequency variable.
 interval_freq = config_contents['update_interval_seconds']
-# Create variable for pathogen coloring cutoff.
-# Used in pathogen info section.
-dll_2 = str(config_contents["danger_lower_limit"])
+
+# Config values used by the callbacks, resolved once here instead of
+# at every update.
+# Taxonomic hierarchy letters, in the order from the config.
+hierarchy_letters = config_contents['taxonomic_hierarchy_letters']
+# Species of interest as taxid: name pairs (the config entry is empty if none are listed).
+species_dict = {entry["taxid"]: entry["name"] for entry in config_contents['species_of_interest'] or []}
+# Position of each letter in the hierarchy, used to sort user selections.
+hierarchy_order = {letter: i for i, letter in enumerate(hierarchy_letters)}
+# Tax IDs of the species of interest.
+pathogen_list = list(species_dict.keys())
+# Same tax IDs as an array, matched against the kreport at every update.
+pathogen_ids = np.asarray(pathogen_list)
+# Cutoff for pathogen coloring.
+# Used in the pathogen callbacks, table and info section.
+danger_lower_limit = int(config_contents["danger_lower_limit"])
 
 # Path to cumulative kraken report.
 # Used to create the raw kraken dataframe.
@@ -257,49 +404,59 @@ blast_dir = os.path.join(config_contents["main_dir"], 'blast_result_files')
 qc_file = os.path.join(config_contents["main_dir"], 'qc_data/cumul_qc.txt')
 # Initial qc data, if no data: creates placeholder df.
 qc_df = get_qc_df(qc_file)
+# Latest qc data and the mtime of the file it was read from,
+# kept up to date by load_qc_df.
+qc_cache = (file_mtime(qc_file), qc_df)
+# Maximum number of points sent for the cumulative QC plots.
+qc_max_points = 2000
 
 # Path to file that stores cumulative fastp data.
 # Used by update_qc_text callback.
 fastp_file = os.path.join(config_contents["main_dir"], 'fastp_reports/compiled_fastp.txt')
-# Initial fastp data, if no data: creates placeholder df.
-fastp_df = get_fastp_df(fastp_file)
 
 # Returns the current time for initial display.
-# Used by update_timestamp callback.
+# Later updated in the browser by the timestamp clientside callback.
 time_token = get_time()
 
-# Live updates on by default.
-update_disabled = False
-
 # Initial empty raw kraken placeholder dataframe.
 zero_data = np.zeros((2,6))
-raw_df = pd.DataFrame(zero_data, columns=None)
+placeholder_raw_df = pd.DataFrame(zero_data, columns=None)
+raw_df = placeholder_raw_df
+# Modification time of the kreport that raw_df was created from.
+# Used as cache key for data derived from raw_df.
+# None until the first kreport has been loaded.
+raw_df_mtime = None
+
+# Table columns for the pathogen list, without and with BLAST validation.
+# The columns never change otherwise, so they are only defined here.
+pathogen_columns = [{"name": i, "id": i} for i in ['Name', 'Tax ID', 'Reads']]
+pathogen_columns_val = pathogen_columns + [{"name": 'Validated reads', "id": 'Validated reads'}]
+
+# Columns of the cached pathogen data used by the pathogen callbacks.
+pathogen_info_cols = ['Name', 'Tax ID', 'Reads', 'Color']
 
 # Initial empty pathogen list.
 df_to_print = pd.DataFrame(columns= ['Name', 'Tax ID', 'Reads'])
 
-# Initial placeholder pathogen barchart.
-pathogen_fig = px.bar(qc_df, x='Time', y="Reads")
+# Initial empty pathogen barchart.
+pathogen_fig = create_pathogen_fig()
+# Bar colors for the pathogen coloring scheme.
+pathogen_colors = {'Red': 'red', 'Green': 'green'}
+
+# Table columns for the top list, as produced by create_top_list.
+top_columns = [{"name": i, "id": i} for i in ['Index', 'Name', 'Tax ID', 'Tax Rank', 'Reads']]
 
 # Initial empty top list.
-top_df = pd.DataFrame(columns= ['Name', 'Tax ID', 'Reads'])
+top_df = pd.DataFrame(columns= ['Index', 'Name', 'Tax ID', 'Tax Rank', 'Reads'])
 
 # An empty dataframe for sankey as a placeholder until the first data is produced.
 placeholder_data = sankey_placeholder()
 # Initial sankey plot with placeholder while waiting for data.
 sankey_fig = go.Figure(placeholder_data)
-sankey_fig_layout()
-
-# Initial tax level list before first update.
-clade_list = config_contents['taxonomic_hierarchy_letters']
+sankey_fig_layout(sankey_fig)
 
-# Initial sunburst fig.
-sunburst_fig = create_sunburst(icicle_sunburst_data(raw_df,
-                                                    ['Bacteria',
-                                                     'Archaea',
-                                                     'Eukaryota',
-                                                     'Viruses'], 10, config_file_path=config_file_path)
-                               )
+# Initial empty sunburst fig, filled in by the sunburst callback.
+sunburst_fig = create_sunburst()
 
 ########## LAYOUT OBJECTS #####################################################
 # The layout is organized into a header section and 4 tabs with
@@ -536,7 +693,7 @@ validate_option = html.Div(children=[
 # Tooltip for validation checkbox.
 validation_tooltip = dbc.Tooltip('Adds an additional column with the number of reads validated by BLAST, \
                                  using a minimum percent identity of '+str(config_contents["min_perc_identity"])+' and\
-                                 an e-value cutoff of '+str(config_contents["e_val_cutoff"])+'. Will be added on the next update.',
+                                 an e-value cutoff of '+str(config_contents["e_val_cutoff"])+'.',
                                     target='validate_box',
                                     placement='top',
                                     delay={'show': 1000})
@@ -548,7 +705,7 @@ pathogen_fig_obj = dcc.Graph(id='pathogen_fig',
 pathogen_info_line1 = 'This section shows the abundance of all specified pathogens/species \
 of interest.'
 
-pathogen_info_line2 = 'The barchart and list are colored, so that species with more than ' + str(dll_2) + ' reads \
+pathogen_info_line2 = 'The barchart and list are colored, so that species with more than ' + str(danger_lower_limit) + ' reads \
 show up as red.'
 
 pathogen_info_line3 = 'The "Tax ID" column contains the taxonomic IDs from the databased used.'
@@ -557,7 +714,7 @@ pathogen_info_line4 = '"Reads" is the \
 number of reads assigned to the species.'
 
 pathogen_info_line5 = 'If "BLAST validation" is turned on, an additional column will be \
-added on the next update, containing the number of reads validated by BLAST, using the following parameters:'
+added, containing the number of reads validated by BLAST, using the following parameters:'
 
 pathogen_info_line6 = 'Minimum percent identity: ' + str(config_contents["min_perc_identity"])
 
@@ -857,11 +1014,26 @@ qc_modal = html.Div([
     ),
 ])
 
-# Initial empty placeholder plots (plotly express).
-cumul_reads_fig = px.line(qc_df, x='Time', y="Cumulative reads")
-cumul_bp_fig = px.line(qc_df, x='Time', y="Cumulative bp")
-reads_fig = px.bar(qc_df, x='Time', y="Reads")
-bp_fig = px.bar(qc_df, x='Time', y="Bp")
+# Initial QC plots. WebGL line traces keep the cumulative plots fast
+# when a run produces many batches.
+cumul_reads_fig = create_qc_fig(go.Scattergl(x=qc_df['Time'],
+                                             y=qc_df['Cumulative reads'],
+                                             mode='lines'),
+                                'Cumulative reads over time',
+                                'Cumulative reads')
+cumul_bp_fig = create_qc_fig(go.Scattergl(x=qc_df['Time'],
+                                          y=qc_df['Cumulative bp'],
+                                          mode='lines'),
+                             'Cumulative base pairs (bp) over time',
+                             'Cumulative bp')
+reads_fig = create_qc_fig(go.Bar(x=qc_df['TimeStr'], y=qc_df['Reads']),
+                          'Reads per batch',
+                          'Reads',
+                          batch_axis=True)
+bp_fig = create_qc_fig(go.Bar(x=qc_df['TimeStr'], y=qc_df['Bp']),
+                       'Base pairs (bp) per batch',
+                       'Bp',
+                       batch_axis=True)
 
 # QC plot layout: division into cols and rows, one plot each place.
 qc_row_1 = html.Div(
@@ -1062,6 +1234,16 @@ sunburst_complete = html.Div(
     className="hstack gap-3"
 )
 
+########## DATA STORES ########################################################
+
+# Invisible objects holding intermediate data between callbacks.
+# Modification times of the data files, only changed when the pipeline
+# has written new data. Triggers the data callbacks.
+data_version = dcc.Store(id='data_version')
+# Key of the cached pathogen data (the kreport mtime), updated with
+# new data and displayed by pathogen_update. The data stays on the server.
+pathogen_store = dcc.Store(id='pathogen_store')
+
 ########## INTERVAL COMPONENT #################################################
 
 # Interval component which controls the live update.
@@ -1079,18 +1261,18 @@ interval_component = dcc.Interval(id='interval_component',
 # Organization of layout into four tabs.
 # Wrapping things in dbc.Containers centers them and makes the layout better(?)
 main_tabs = html.Div([
-    dcc.Tabs([
-        dcc.Tab(label='Main', children=[
+    dcc.Tabs(id='main_tabs_component', value='main_tab', persistence=True, children=[
+        dcc.Tab(label='Main', value='main_tab', children=[
             pathogens_top_with_margin,
             html.Br()
         ]),
-        dcc.Tab(label='QC', children=[
+        dcc.Tab(label='QC', value='qc_tab', children=[
             qc_with_margin,
             html.Br(),
             html.Br(),
             html.Br()
         ]),
-        dcc.Tab(label='Sankey plot', children=[
+        dcc.Tab(label='Sankey plot', value='sankey_tab', children=[
             html.Br(),
             sankey_head,
             sankey_plot,
@@ -1099,7 +1281,7 @@ main_tabs = html.Div([
             html.Br(),
             html.Br()
         ]),
-        dcc.Tab(label='Sunburst chart', children=[
+        dcc.Tab(label='Sunburst chart', value='sunburst_tab', children=[
             html.Br(),
             sunburst_head,
             sunburst_complete,
@@ -1114,6 +1296,8 @@ main_tabs = html.Div([
 app.layout= html.Div([upper_gui_layout,
                       html.Br(),
                       main_tabs,
+                      data_version,
+                      pathogen_store,
                       interval_component
                       ])
 
@@ -1121,115 +1305,141 @@ app.layout= html.Div([upper_gui_layout,
 # Callback functions define what happens in the layout objects.
 
 # Updates the time displayed for when the latest update happened.
-@app.callback(Output('timestamp', 'children'), # plain text
-              Input('interval_component', 'n_intervals')) # interval
-def update_timestamp(interval_trigger):
-    time_token = get_time()
-    return 'Latest update: ', time_token
+# Runs in the browser, so the interval does not need a server round trip
+# for this. Same HH:MM:SS format as get_time.
+app.clientside_callback(
+    '''
+    function(interval_trigger) {
+        var time_token = new Date().toTimeString().slice(0, 8);
+        return ['Latest update: ', time_token];
+    }
+    ''',
+    Output('timestamp', 'children'), # plain text
+    Input('interval_component', 'n_intervals') # interval
+)
 
 # Controls the live update toggle on/off and displays the current status.
 @app.callback(Output('update_status', 'children'), # text info on state
               Output('interval_component', 'disabled'), # actual on/off
               Input('update_toggle', 'value')) # toggle is clicked: bool
 def live_update(toggle_value):
-    # update globally to not cause problems
-    global update_disabled
-    update_disabled = toggle_value
+    # The interval component itself holds the on/off state:
+    # while it is disabled no new data is loaded.
     # display on/off status
-    if update_disabled == False:
+    if toggle_value == False:
         status_var = 'on'
     else:
         status_var = 'off'
-    return status_var, update_disabled
+    return status_var, toggle_value
+
+########## CALLBACK FOR NEW DATA ##############################################
+
+# Checks at every interval if the pipeline has written new data.
+# The data callbacks are triggered by data_version instead of the interval,
+# so nothing is reloaded, recomputed or sent while the files are unchanged.
+@app.callback(Output('data_version', 'data'), # data file mtimes
+              Input('interval_component', 'n_intervals'), # interval
+              State('data_version', 'data')) # mtimes at last check
+def update_data_version(interval_trigger, prev_version):
+    # Updates the global variables for use in other functions.
+    # raw_df is the imported cumulative kreport file.
+    global raw_df, raw_df_mtime
+    version = [file_mtime(kreport_file),
+               file_mtime(qc_file),
+               file_mtime(fastp_file),
+               file_mtime(blast_dir)]
+    if version == prev_version:
+        return dash.no_update
+    # Imports the latest kreport as a df before the data callbacks run.
+    # Only parsed again if the file has changed since last time.
+    kreport_mtime = version[0]
+    if kreport_mtime is not None and kreport_mtime != raw_df_mtime:
+        raw_df = cached_raw_df(kreport_file, kreport_mtime)
+        raw_df_mtime = kreport_mtime
+    return version
 
 ########## CALLBACKS FOR SANKEY PLOT ##########################################
 
 # Creates the sankey plot and updates it live.
+# Only while the sankey tab is shown; it is brought up to date
+# when the tab is opened.
 @app.callback(Output(component_id='sankey_plot', component_property='figure'),
-              Input('interval_component', 'n_intervals'), # updates with interval
+              Input('data_version', 'data'), # new data
               Input('filter_submit', 'n_clicks'), # or with button click
+              Input('main_tabs_component', 'value'), # or when tab is opened
               State('filter_value', 'value'),
               State('domains', 'value'),
               State('clades', 'value')) # all the filters are states until click
-def update_sankey(interval_trigger, filter_click, filter_value, domains, clades):
-    global sankey_fig
-    real_list = config_contents['taxonomic_hierarchy_letters']
+def update_sankey(data_trigger, filter_click, active_tab, filter_value, domains, clades):
+    if active_tab != 'sankey_tab':
+        return dash.no_update
     # The clade list will reorder itself when manipulated by user.
-    # This function makes sure everything is set back to the right order.
-    fixed_clades = fix_list_order(real_list, clades)
+    # Sorting by the config order sets everything back to the right order.
+    fixed_clades = sorted(clades, key=hierarchy_order.__getitem__)
     #  creates the figure
-    sankey_fig = go.Figure(create_sankey_data(domains, fixed_clades, int(filter_value)))
-    sankey_fig_layout()
+    sankey_fig = go.Figure(cached_sankey_data(raw_df_mtime,
+                                              tuple(domains),
+                                              tuple(fixed_clades),
+                                              int(filter_value)))
+    sankey_fig_layout(sankey_fig)
     return sankey_fig
 
 ########## CALLBACKS FOR SUNBURST ############################################
 
-# Creates the sunburst plot and updates it live
+# Updates the sunburst plot live. Only the data is sent,
+# the layout is set once in create_sunburst.
+# Only while the sunburst tab is shown; it is brought up to date
+# when the tab is opened.
 @app.callback(Output(component_id='sunburst_chart', component_property='figure'),
-              Input('interval_component', 'n_intervals'), # updates with interval
+              Input('data_version', 'data'), # new data
               Input('sun_submit', 'n_clicks'), # or with button click
+              Input('main_tabs_component', 'value'), # or when tab is opened
               State('sun_filter_val', 'value'),
               State('sun_domains', 'value')) # all the filters are states until click
-def update_sunburst(interval_trigger, filter_click, filter_value, domains):
-    data = icicle_sunburst_data(raw_df, domains, int(filter_value), config_file_path=config_file_path)
-    sunburst_fig = create_sunburst(data)
-    return sunburst_fig
+def update_sunburst(data_trigger, filter_click, active_tab, filter_value, domains):
+    if active_tab != 'sunburst_tab':
+        return dash.no_update
+    data = cached_icicle_data(raw_df_mtime, tuple(domains), int(filter_value))
+    sunburst_patch = Patch()
+    sunburst_patch['data'][0]['labels'] = data['Taxon']
+    sunburst_patch['data'][0]['parents'] = data['Parent']
+    sunburst_patch['data'][0]['values'] = data['Reads']
+    sunburst_patch['data'][0]['marker']['colors'] = data['Reads']
+    return sunburst_patch
 
 ########## CALLBACKS FOR PATHOGEN INFO ########################################
 
-# Pathogen detection callback: produces a colored list of
-# pre-defined species and nr of reads for them.
-# Also displays a colored barchart.
+# Pathogen detection callback: collects the reads for the
+# pre-defined species in the server side cache and stores its key
+# for the pathogen_update callback.
 # If interval is disabled, it should keep the latest values.
-@app.callback(Output('pathogen_fig', 'figure'), # barchart
+@app.callback(Output('pathogen_store', 'data'), # pathogen data key
+              Input('data_version', 'data') # new data
+              )
+def pathogen_data_update(data_trigger):
+    # The species of interest and the cutoff are resolved from the config at startup.
+    cached_pathogen_info(raw_df_mtime)
+    # Returned on every data update so the validation counts are refreshed.
+    return raw_df_mtime
+
+# Displays the stored pathogen data as a colored list and a colored barchart.
+# Runs when new data is stored or when validation is switched on/off,
+# so toggling validation does not recompute the pathogen data.
+@app.callback(Output('pathogen_fig', 'figure'), # barchart, partial update
               Output('pathogen_table', 'data'), # row data for table
               Output('pathogen_table', 'columns'), # specify table cols
-              Input('interval_component', 'n_intervals'), # interval update
-              State('validate_box', 'value') # valiaditon option
+              Input('pathogen_store', 'data'), # pathogen data key
+              Input('validate_box', 'value') # valiaditon option
               )
-def pathogen_update(interval_trigger, val_state):
-    # Create a dictionary to keep track of name and taxid pairs
-    species_dict = {entry["taxid"]: entry["name"] for entry in config_contents['species_of_interest']}
-
-    # Extract taxids to create the pathogen list
-    pathogen_list = list(species_dict.keys())
-
-    pathogen_info = pathogen_df(pathogen_list, raw_df)
-    # Cutoff for coloring.
-    dll = int(config_contents["danger_lower_limit"])
-    # Deals with species of interest not present in kreport.
-    for taxid in pathogen_list:
-        if taxid not in pathogen_info['Tax ID'].values:
-            # Use the species name from species_dict instead of 'not found in DB'
-            species_name = species_dict[taxid]
-            pathogen_info.loc[len(pathogen_info.index)] = [species_name,  # add pathogen name
-                                                           taxid, # add pathogen taxID
-                                                           0,# add pathogen nr of reads
-                                                           0.0, # add percent reads for pathogens
-                                                           0] # not needed anymore, remove later
+def pathogen_update(pathogen_key, val_state):
+    pathogen_info = cached_pathogen_info(pathogen_key)
 
-    # Adding a column for the coloring sceme.
-    pathogen_info['Color'] = pathogen_info['Reads'].apply(lambda x: 'Green' if x < dll else 'Red')
-
-    # Create the barchart from the pathogen_info table.
-    pathogen_barchart_fig = px.bar(pathogen_info,
-                                         x='Name',
-                                         y='Reads',
-                                         color='Color',
-                                         labels={'Reads': 'Number of Reads',
-                                                 'Name': 'Species'},
-                                         title='Number of reads per species of interest',
-                                         color_discrete_map={'Red': 'red', 'Green': 'green'})
-
-    # Change size of graph.
-    pathogen_barchart_fig.update_layout(width=700, height=400)
-    # Change width of columns.
-    pathogen_barchart_fig.update_traces(width=0.4)
-    # Change hover info.
-    pathogen_barchart_fig.update_traces(hovertemplate='<b>%{x}</b><br>Number of Reads: %{y}',
-                            hoverinfo='x+y')
-    # Remove unnecessary legend.
-    pathogen_barchart_fig.update_traces(showlegend=False)
+    # Update the bars of the barchart from the pathogen_info table.
+    # The layout is set once in create_pathogen_fig.
+    pathogen_barchart_patch = Patch()
+    pathogen_barchart_patch['data'][0]['x'] = pathogen_info['Name'].to_numpy()
+    pathogen_barchart_patch['data'][0]['y'] = pathogen_info['Reads'].to_numpy()
+    pathogen_barchart_patch['data'][0]['marker']['color'] = pathogen_info['Color'].map(pathogen_colors).to_numpy()
 
     # create a df with the pathogen cols to be displayed
     df_to_print = pathogen_info[['Name', 'Tax ID', 'Reads']].copy()
@@ -1249,80 +1459,67 @@ def pathogen_update(interval_trigger, val_state):
     df_to_print = df_to_print.reset_index(drop=True)
     # dash handling
     data = df_to_print.to_dict('records')
-    columns = [{"name": i, "id": i} for i in df_to_print.columns]
-    return pathogen_barchart_fig, data, columns
+
+    # The table columns only change when validation is switched on/off.
+    columns = dash.no_update
+    ctx = dash.callback_context
+    if ctx.triggered and ctx.triggered[0]['prop_id'].split('.')[0] == 'validate_box':
+        if val_state:
+            columns = pathogen_columns_val
+        else:
+            columns = pathogen_columns
+    return pathogen_barchart_patch, data, columns
 
 ########## CALLBACKS FOR TOP TABLE ############################################
 
 # Creates a list of the taxa with the highest number of reads.
 @app.callback(Output('top_table', 'data'), # row data for table
-              Output('top_table', 'columns'), # specify table cols
-              Input('interval_component', 'n_intervals'), # interval update
+              Input('data_version', 'data'), # new data
               Input('toplist_submit', 'n_clicks'), # or with button click
               State('toplist_domains', 'value'),
               State('toplist_clades', 'value'),
               State('top_filter_val', 'value'))
-def toplist_update(interval_trigger, click, domains, clades, top):
+def toplist_update(data_trigger, click, domains, clades, top):
     top_df =  create_top_list(raw_df, domains, clades, int(top))
     data = top_df.to_dict('records')
-    columns = [{"name": i, "id": i} for i in top_df.columns]
-    return data, columns
+    return data
 
 ########## QC CALLBACKS #######################################################
 
 # Displays 4 qc plots on read data over time.
+# Only the trace data is sent, the layout is set when the figures are created.
+# Only while the QC tab is shown; the plots are brought up to date
+# when the tab is opened.
 # If interval is disabled, it should keep the latest values.
-@app.callback(Output('cumul_reads_graph', 'figure'), # plotly express plots
+@app.callback(Output('cumul_reads_graph', 'figure'), # partial figure updates
               Output('cumul_bp_graph', 'figure'),
               Output('reads_graph', 'figure'),
               Output('bp_graph', 'figure'),
-              Input('interval_component', 'n_intervals')) # interval input
-def update_qc_plots(interval_trigger):
+              Input('data_version', 'data'), # new data
+              Input('main_tabs_component', 'value')) # or when tab is opened
+def update_qc_plots(data_trigger, active_tab):
+    if active_tab != 'qc_tab':
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
     # creates df from qc file
     # qc file path specified at the start of this script
-    qc_df = get_qc_df(qc_file)
-    # defines data for the 4 plots
-    cumul_reads_fig = px.line(qc_df, x='Time', y="Cumulative reads")
-    cumul_bp_fig = px.line(qc_df, x='Time', y="Cumulative bp")
-    # Modify time points for batches, use in barplots.
-    time_for_barplots = pd.to_datetime(qc_df["Time"]).dt.strftime("%H:%M:%S")
-    reads_fig = px.bar(qc_df, x=time_for_barplots, y="Reads")
-    bp_fig = px.bar(qc_df, x=time_for_barplots, y="Bp")
-    # Update x axis label for barcharts.
-    reads_fig.update_xaxes(title_text="Batch timestamp")
-    bp_fig.update_xaxes(title_text="Batch timestamp")
-    # Make barcharts discrete instead of continous.
-    reads_fig.update_xaxes(type='category')
-    bp_fig.update_xaxes(type='category')
-    # Define some size parameters.
-    standard_width = 650
-    standard_height = 350
-    b_marg = 10
-    l_marg = 10
-    t_marg = 35
-    r_marg = 10
-    # Update the layout of all charts. Should be a separate script.
-    cumul_reads_fig.update_layout(width=standard_width,
-                                  height=standard_height,
-                                  margin=dict(l=l_marg, r=r_marg, t=t_marg, b=b_marg),
-                                  title='Cumulative reads over time'
-                                  )
-    cumul_bp_fig.update_layout(width=standard_width,
-                               height=standard_height,
-                               margin=dict(l=l_marg, r=r_marg, t=t_marg, b=b_marg),
-                               title='Cumulative base pairs (bp) over time'
-                               )
-    reads_fig.update_layout(width=standard_width,
-                            height=standard_height,
-                            margin=dict(l=l_marg, r=r_marg, t=t_marg, b=b_marg),
-                            title='Reads per batch'
-                            )
-    bp_fig.update_layout(width=standard_width,
-                         height=standard_height,
-                         margin=dict(l=l_marg, r=r_marg, t=t_marg, b=b_marg),
-                         title='Base pairs (bp) per batch'
-                         )
-    return cumul_reads_fig, cumul_bp_fig, reads_fig, bp_fig
+    qc_df = load_qc_df()
+    # The cumulative plots are downsampled for long runs, it makes no
+    # visible difference for a monotonic line. The batches are sorted
+    # by time, so the batch number is used as x for the downsampling.
+    batch_nr = np.arange(qc_df.shape[0])
+    reads_keep = lttb_downsample(batch_nr, qc_df['Cumulative reads'].to_numpy(), qc_max_points)
+    bp_keep = lttb_downsample(batch_nr, qc_df['Cumulative bp'].to_numpy(), qc_max_points)
+    # numpy arrays, not Series, are passed on for faster serialization
+    times = qc_df['Time'].to_numpy()
+    cumul_reads = qc_df['Cumulative reads'].to_numpy()
+    cumul_bp = qc_df['Cumulative bp'].to_numpy()
+    cumul_reads_patch = qc_patch(times[reads_keep], cumul_reads[reads_keep])
+    cumul_bp_patch = qc_patch(times[bp_keep], cumul_bp[bp_keep])
+    # Batch time points (formatted in get_qc_df) are used in the barplots.
+    time_strs = qc_df['TimeStr'].to_numpy()
+    reads_patch = qc_patch(time_strs, qc_df['Reads'].to_numpy())
+    bp_patch = qc_patch(time_strs, qc_df['Bp'].to_numpy())
+    return cumul_reads_patch, cumul_bp_patch, reads_patch, bp_patch
 
 # Displays classified, unclassified and total reads from Kraken.
 # Also displays filter info.
@@ -1335,28 +1532,25 @@ def update_qc_plots(interval_trigger):
               Output('qc_too_short', 'children'),
               Output('qc_low_complexity', 'children'),
               Output('qc_reads_removed', 'children'),
-              Input('interval_component', 'n_intervals') # interval input
+              Input('data_version', 'data') # new data
               )
-def update_qc_text(interval_trigger):
+def update_qc_text(data_trigger):
     # uses the latest raw kraken df to extract the info
     c = int(raw_df.iloc[1,1]) # nr of classified reads
     u = int(raw_df.iloc[0,1]) # nr of unclassified reads
-    t = c+u # total nr of processed reads
     pc = float(round(raw_df.iloc[1,0],1)) # percent classified
     pu = float(round(raw_df.iloc[0,0],1)) # percent unclassified
     # Define the classified info objects.
     classified_reads = 'Classified reads: ' + str(c) + ' (' + str(pc) + '%)'
     unclassified_reads = 'Unclassified reads: ' + str(u) + ' (' + str(pu) + '%)'
     # Needed to extract the number of pre-filter reads etc.
-    qc_df_b = get_qc_df(qc_file)
+    qc_df_b = load_qc_df()
     # Define the filter info objects.
     tot_reads_pre_filt = int(qc_df_b['Cumulative reads'].iloc[-1])
     unfiltered_reads = 'Total reads pre filtering: ' + str(tot_reads_pre_filt)
-    #total_reads = 'Total reads post filtering: ' + str(t)
-    #filtered_proportion = 'Reads that passed filtering: ' + str(float(round((t*100)/tot_reads_pre_filt, 1))) + ' %'
     # Define the filter setting objects.
     # Load the latest cumulative fastP info file.
-    fastp_df = get_fastp_df(fastp_file)
+    fastp_df = cached_fastp_df(fastp_file, file_mtime(fastp_file))
     # Create info variables.
     tot_passed_reads = int(fastp_df['cum_passed_filter_reads'].iloc[-1])
     tot_low_quality_reads = int(fastp_df['cum_low_quality_reads'].iloc[-1])
@@ -1404,7 +1598,7 @@ def update_waiting_files(interval_trigger):
         # number of files nanopore has produced:
         nanop_files = os.listdir(nanopore_dir)
         # get the number of processed files from qc data
-        qc_df_2 = get_qc_df(qc_file)
+        qc_df_2 = load_qc_df()
         # check if its the qc placeholder, i.e. no data yet
         if qc_df_2.iloc[0,0] == '0.0':
             files_processed = 0 # if it is, assign 0
@@ -1541,7 +1735,11 @@ def run_app():
     '''
     # A unique port specifiable in config.
     # Debug=True means it updates as you make changes in this script.
-    app.run(debug=True, port=int(config_contents['gui_port']))
+    # Threaded: each callback request is handled in its own thread, so a
+    # slow callback does not block the others. Background callbacks are
+    # not used since they run in separate processes without the data
+    # loaded and cached here.
+    app.run(debug=True, threaded=True, port=int(config_contents['gui_port']))
 if __name__ == "__main__":
     # The run_app makes it run as an entry point (bash command).
     run_app()